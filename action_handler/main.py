@@ -1,30 +1,55 @@
 import functions_framework
 from google.cloud import firestore
 import smtplib
+import threading
 from email.mime.text import MIMEText
 import logging
-import json
+import orjson
 
 # Initialize Firestore client
 db = firestore.Client()
 
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 587
+SMTP_USERNAME = "xxx@gmail.com"
+SMTP_PASSWORD = "xxx"
+SENDER_EMAIL = "xxx@gmail.com"
+
+# SMTP connection reused across warm invocations (guarded by the lock)
+_SMTP_LOCK = threading.Lock()
+_SMTP = None
+
+def _get_smtp():
+    """Return a live SMTP connection, (re)connecting if needed. Caller must hold _SMTP_LOCK."""
+    global _SMTP
+    if _SMTP is not None:
+        try:
+            if _SMTP.noop()[0] == 250:
+                return _SMTP
+        except smtplib.SMTPException:
+            pass
+        _SMTP = None
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+    server.starttls()
+    server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    _SMTP = server
+    return _SMTP
+
 def send_email(to_address, body):
     """Helper function to send emails"""
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-    smtp_username = "xxx@gmail.com"
-    smtp_password = "xxx"
-    sender_email = "xxx@gmail.com"
-
+    global _SMTP
     msg = MIMEText(body)
     msg['Subject'] = 'Automated Notification'
-    msg['From'] = sender_email
+    msg['From'] = SENDER_EMAIL
     msg['To'] = to_address
 
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        server.send_message(msg)
+    with _SMTP_LOCK:
+        try:
+            _get_smtp().send_message(msg)
+        except smtplib.SMTPException:
+            # Drop the cached connection so the next attempt reconnects
+            _SMTP = None
+            raise
 
 def add_todo(body):
     """Helper function to add a todo item to Firestore"""
@@ -54,8 +79,8 @@ def process_rule(action, action_data):
 def action_handler(request):
     """Main function to handle incoming HTTP requests"""
     try:
-        # Get the raw body and deserialize JSON
-        data = request.get_json()
+        # Get the raw body and deserialize JSON with orjson (C-level parse)
+        data = orjson.loads(request.get_data())
 
         action = data.get('action')
         action_data = data.get('action_data', {})
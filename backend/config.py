@@ -1,13 +1,28 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
-from functools import lru_cache
+from itertools import cycle
+
+# Number of Firestore clients (one gRPC channel each) to round-robin over.
+# A single default channel serializes concurrent requests; a small pool
+# lets them spread across channels.
+POOL_SIZE = 8
 
 class FirebaseConfig:
-    def __init__(self):
-        # Initialize Firebase Admin SDK
-        firebase_admin.initialize_app()
-        self.db = firestore.client()
+    def __init__(self, app_name=None):
+        # Initialize Firebase Admin SDK; each named app gets its own
+        # Firestore client and therefore its own gRPC channel
+        if app_name is None:
+            app = firebase_admin.initialize_app()
+        else:
+            app = firebase_admin.initialize_app(name=app_name)
+        self.db = firestore.client(app=app)
+
+_pool = None
+_picker = None
 
-@lru_cache()
 def get_firebase_config():
-    return FirebaseConfig()
\ No newline at end of file
+    global _pool, _picker
+    if _pool is None:
+        _pool = [FirebaseConfig()] + [FirebaseConfig(f"pool-{i}") for i in range(1, POOL_SIZE)]
+        _picker = cycle(_pool)
+    return next(_picker)
@@ -1,8 +1,8 @@
 from datetime import datetime, timezone
 from enum import Enum
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
-from uuid import uuid4
+from pydantic import BaseModel, Field, TypeAdapter
+from secrets import token_hex
 
 class Priority(str, Enum):
     Low = "Low"
@@ -21,28 +21,7 @@ class TaskCreate(TaskBase):
     pass
 
 class Task(TaskBase):
-    document_id: str = Field(default_factory=lambda: str(uuid4().hex))
-
-    def to_dict(self):
-        return {
-            "document_id": self.document_id,
-            "title": self.title,
-            "dueDate": self.dueDate.isoformat(),
-            "priority": self.priority,
-            "description": self.description,
-            "source": self.source
-        }
-
-    @classmethod
-    def from_dict(cls, data: dict):
-        return cls(
-            document_id=data.get("document_id"),
-            title=data.get("title"),
-            dueDate=datetime.fromisoformat(data.get("dueDate")),
-            priority=data.get("priority"),
-            description=data.get("description"),
-            source=data.get("source")
-        )
+    document_id: str = Field(default_factory=lambda: token_hex(16))
 
 class NodeType(str, Enum):
     GET_DATA = "get_data"
@@ -62,13 +41,14 @@ class Node(BaseModel):
 class ActionFlow(BaseModel):
     description: str = ""
     enabled: bool = True
-    id: str = Field(default_factory=lambda: str(uuid4().hex))
+    id: str = Field(default_factory=lambda: token_hex(16))
     interval: int = 3600
     last_run: str = str(datetime(1970, 1, 1, tzinfo=timezone.utc).isoformat())
     name: str
     start_node: str
     nodes: list[Node]
 
-    @classmethod
-    def from_dict(cls, data: dict):
-        return cls(**data)
\ No newline at end of file
+# Precompiled adapters: validation/serialization runs in pydantic-core
+# instead of hand-written to_dict/from_dict methods
+TASK_ADAPTER = TypeAdapter(Task)
+ACTIONFLOW_ADAPTER = TypeAdapter(ActionFlow)
\ No newline at end of file
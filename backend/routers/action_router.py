@@ -1,44 +1,75 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from typing import List
-from models import ActionFlow, Node
+from models import ActionFlow, Node, ACTIONFLOW_ADAPTER
 from config import FirebaseConfig, get_firebase_config
 from uuid import uuid4
+import asyncio
 
 router = APIRouter()
 
-@router.get("/action", response_model=list[dict[str, str]])
+# Process-level caches for the rarely-changing rules collection. A realtime
+# listener on "rules" evicts entries, so steady-state reads cost no Firestore ops
+_actions_list_cache = None
+_action_nodes_cache: dict[str, ActionFlow] = {}
+_rules_listener = None
+
+def _on_rules_snapshot(snapshot, changes, read_time):
+    global _actions_list_cache
+    _actions_list_cache = None
+    for change in changes:
+        _action_nodes_cache.pop(change.document.id, None)
+
+def _ensure_rules_listener(db):
+    global _rules_listener
+    if _rules_listener is None:
+        _rules_listener = db.collection("rules").on_snapshot(_on_rules_snapshot)
+
+@router.get("/action")
 async def get_actions(firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Get all action IDs"""
+    global _actions_list_cache
+    _ensure_rules_listener(firebase.db)
+    if _actions_list_cache is not None:
+        return ORJSONResponse(_actions_list_cache)
     actions_ref = firebase.db.collection("rules")
-    docs = actions_ref.stream()
+    docs = await asyncio.to_thread(lambda: list(actions_ref.stream()))
     ret = []
     for doc in docs:
         doc_dict = doc.to_dict()
         ret.append({"action_id": doc.id, "name": doc_dict.get("name"), "description": doc_dict.get("description")})
-    return ret
+    _actions_list_cache = ret
+    return ORJSONResponse(ret)
 
 @router.get("/action/{action_id}/nodes", response_model=ActionFlow)
 async def get_action_nodes(action_id: str, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Get nodes for a specific action"""
+    _ensure_rules_listener(firebase.db)
+    cached = _action_nodes_cache.get(action_id)
+    if cached is not None:
+        return cached
     doc_ref = firebase.db.collection("rules").document(action_id)
-    doc = doc_ref.get()
+    doc = await asyncio.to_thread(doc_ref.get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Action not found")
-    return ActionFlow.from_dict(doc.to_dict())
+    action_flow = ACTIONFLOW_ADAPTER.validate_python(doc.to_dict())
+    _action_nodes_cache[action_id] = action_flow
+    return action_flow
 
 @router.post("/action/create", response_model=dict)
 async def create_action(action_flow: ActionFlow, firebase: FirebaseConfig = Depends(get_firebase_config,)):
     """Create a new action flow"""
     doc_ref = firebase.db.collection("rules").document(action_flow.id)
-    doc_ref.set(action_flow.model_dump())
+    await asyncio.to_thread(doc_ref.set, action_flow.model_dump())
     return {"action_id": action_flow.id}
 
 @router.post("/action/{action_id}/nodesupdate", response_model=dict)
 async def update_action_nodes(action_id: str, nodes: list[Node], start_node: Node, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Update nodes for an existing action"""
     doc_ref = firebase.db.collection("rules").document(action_id)
-    # Update the start node
-    doc_ref.update({"start_node": start_node.id})
-    # Update the nodes
-    doc_ref.update({"nodes": [node.model_dump() for node in nodes]})    
+    # Update the start node and the nodes in a single write
+    await asyncio.to_thread(doc_ref.update, {
+        "start_node": start_node.id,
+        "nodes": [node.model_dump() for node in nodes],
+    })
     return {"success": True}
\ No newline at end of file
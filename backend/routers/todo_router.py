@@ -1,10 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
-from models import Task, TaskCreate, Priority
+from models import Task, TaskCreate, Priority, TASK_ADAPTER
 from config import FirebaseConfig, get_firebase_config
 from openai import OpenAI
 from pydantic import BaseModel
-import json
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+import asyncio
+import orjson
 from datetime import datetime, timedelta
 
 client = OpenAI(api_key="xxx", base_url="https://api.sambanova.ai/v1")
@@ -15,10 +19,7 @@ class ModelOutput(BaseModel):
 
 router = APIRouter()
 
-@router.get("/reorder_task", response_model=dict)
-async def reorder_tasks(firebase: FirebaseConfig = Depends(get_firebase_config)):
-    """Reorder tasks using AI based on attributes"""
-    PROMPT = """
+PROMPT = """
     # Task Prioritization System
 
     You are a professional task management assistant. Your role is to help prioritize tasks by analyzing their attributes and assigning appropriate priority levels (Low, Medium, or High).
@@ -96,19 +97,25 @@ async def reorder_tasks(firebase: FirebaseConfig = Depends(get_firebase_config))
     Remember: Your goal is to help professionals manage their tasks effectively by assigning appropriate priorities based on the given criteria. Always maintain consistency in your prioritization logic.
     """
 
-    # get all tasks from Firebase
+_SYSTEM_MESSAGE = {"role": "system", "content": PROMPT}
+
+@router.get("/reorder_task", response_model=dict)
+async def reorder_tasks(firebase: FirebaseConfig = Depends(get_firebase_config)):
+    """Reorder tasks using AI based on attributes"""
+    # Only fetch tasks that can still change priority: open ones due soon.
+    # Needs the (completed, dueDate) composite index in firestore.indexes.json
     tasks_ref = firebase.db.collection("tasks")
-    docs = tasks_ref.stream()
-    tasks = [Task.from_dict(doc.to_dict()) for doc in docs]
+    due_cutoff = (datetime.now() + timedelta(days=8)).isoformat()
+    query = tasks_ref.where(filter=FieldFilter("completed", "==", False)).where(filter=FieldFilter("dueDate", "<=", due_cutoff))
+    tasks = await asyncio.to_thread(lambda: [TASK_ADAPTER.validate_python(doc.to_dict()) for doc in query.stream()])
 
     model="Meta-Llama-3.1-8B-Instruct"
-    messages=[
-        {"role": "system", "content": PROMPT},
-    ]
+    # Send all tasks as one user message so the (cached) system prompt is
+    # shared across the whole batch instead of repeated per task
+    user_msg = orjson.dumps([task.model_dump(mode="json") for task in tasks]).decode()
+    messages = [_SYSTEM_MESSAGE, {"role": "user", "content": user_msg}]
+
 
-    for task in tasks:
-        messages.append({"role": "user", "content": f"{task.model_dump_json()}"})
-    
     completion = client.beta.chat.completions.parse(model=model, messages=messages, temperature =  0.1,
         top_p = 0.1)
 
@@ -118,40 +125,62 @@ async def reorder_tasks(firebase: FirebaseConfig = Depends(get_firebase_config))
 
     event = event[event.find("{"):event.find("}")+1]
     
-    event = json.loads(event)
+    event = orjson.loads(event)
 
     print(event)
-    # Update task priorities in Firebase
-    for output in event:
-        doc_ref = firebase.db.collection("tasks").document(event.get("document_id"))
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise HTTPException(status_code=404, detail="Task not found")
-        doc_ref.update({"priority": event.get("updated_priority")})
+    # Model may return a single object or a list of them
+    if isinstance(event, dict):
+        event = [event]
+
+    # Update task priorities in Firebase with a BulkWriter, which batches
+    # and pipelines the writes internally
+    def _apply_all():
+        bulk_writer = firebase.db.bulk_writer()
+        for output in event:
+            doc_ref = firebase.db.collection("tasks").document(output.get("document_id"))
+            bulk_writer.update(doc_ref, {"priority": output.get("updated_priority")})
+        bulk_writer.close()
+
+    await asyncio.to_thread(_apply_all)
 
     # Implementation for AI-based reordering would go herey
     return {"success": True}
 
+def _count(query) -> int:
+    """Run a Firestore count() aggregation and unwrap the single result."""
+    result = query.count().get()
+    return int(result[0][0].value)
+
 @router.get("/taskstats", response_model=dict)
 async def get_task_stats(firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Get statistics on task priorities"""
     tasks_ref = firebase.db.collection("tasks")
-    docs = tasks_ref.get()
-    stats = {"Low": 0, "Medium": 0, "High": 0, "Due_Today": 0, "Due_This_Week": 0, "Due_Later": 0, "Completed": 0}
-    for doc in docs:
-        task = Task.from_dict(doc.to_dict())
-        if task.completed:
-            stats["Completed"] += 1
-        if task.dueDate.date() == datetime.now().date():
-            stats["Due_Today"] += 1
-        elif task.dueDate.date() <= (datetime.now() + timedelta(days=7)).date():
-            stats["Due_This_Week"] += 1
-        else:
-            stats["Due_Later"] += 1
-        stats[task.priority] += 1
-    return stats
-
-@router.get("/task", response_model=List[Task])
+    # Read the clock once and derive every cutoff from it;
+    # dueDate is stored as an ISO string, so range filters compare lexicographically
+    day_start = datetime.combine(datetime.now().date(), datetime.min.time())
+    today_start = day_start.isoformat()
+    tomorrow = (day_start + timedelta(days=1)).isoformat()
+    week_cutoff = (day_start + timedelta(days=8)).isoformat()
+    low, medium, high, completed, due_today, due_this_week, due_later = await asyncio.gather(
+        asyncio.to_thread(_count, tasks_ref.where("priority", "==", "Low")),
+        asyncio.to_thread(_count, tasks_ref.where("priority", "==", "Medium")),
+        asyncio.to_thread(_count, tasks_ref.where("priority", "==", "High")),
+        asyncio.to_thread(_count, tasks_ref.where("completed", "==", True)),
+        asyncio.to_thread(_count, tasks_ref.where("dueDate", ">=", today_start).where("dueDate", "<", tomorrow)),
+        asyncio.to_thread(_count, tasks_ref.where("dueDate", ">=", tomorrow).where("dueDate", "<", week_cutoff)),
+        asyncio.to_thread(_count, tasks_ref.where("dueDate", ">=", week_cutoff)),
+    )
+    return {
+        "Low": low,
+        "Medium": medium,
+        "High": high,
+        "Due_Today": due_today,
+        "Due_This_Week": due_this_week,
+        "Due_Later": due_later,
+        "Completed": completed,
+    }
+
+@router.get("/task")
 async def get_tasks(
     source: Optional[str] = Query(None, description="Filter tasks by source"),
     firebase: FirebaseConfig = Depends(get_firebase_config)
@@ -169,8 +198,10 @@ async def get_tasks(
         tasks_ref = tasks_ref.where("source", "==", source)
     
     try:
-        docs = tasks_ref.stream()
-        return [Task.from_dict(doc.to_dict()) for doc in docs]
+        # Firestore documents are already JSON-shaped dicts; skip the
+        # Task round-trip through Pydantic and serialize them directly
+        docs = await asyncio.to_thread(lambda: [doc.to_dict() for doc in tasks_ref.stream()])
+        return ORJSONResponse(docs)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving tasks: {str(e)}")
 
@@ -178,44 +209,42 @@ async def get_tasks(
 async def get_task(document_id: str, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Get a specific task by ID"""
     doc_ref = firebase.db.collection("tasks").document(document_id)
-    doc = doc_ref.get()
+    doc = await asyncio.to_thread(doc_ref.get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Task not found")
-    return Task.from_dict(doc.to_dict())
+    return TASK_ADAPTER.validate_python(doc.to_dict())
 
 @router.post("/task", response_model=dict)
 async def create_task(task: TaskCreate, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Create a new task"""
     new_task = Task(**task.model_dump())
     doc_ref = firebase.db.collection("tasks").document(new_task.document_id)
-    doc_ref.set(new_task.to_dict())
+    await asyncio.to_thread(doc_ref.set, TASK_ADAPTER.dump_python(new_task, mode="json"))
     return {"document_id": new_task.document_id}
 
 @router.delete("/task/{document_id}", response_model=dict)
 async def delete_task(document_id: str, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Delete a task"""
     doc_ref = firebase.db.collection("tasks").document(document_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Task not found")
-    doc_ref.delete()
+    await asyncio.to_thread(doc_ref.delete)
     return {"success": True}
 
 @router.post("/task/{document_id}/complete", response_model=dict)
 async def complete_task(document_id: str, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Mark a task as completed"""
     doc_ref = firebase.db.collection("tasks").document(document_id)
-    doc = doc_ref.get()
-    if not doc.exists:
+    try:
+        await asyncio.to_thread(doc_ref.update, {"completed": True})
+    except NotFound:
         raise HTTPException(status_code=404, detail="Task not found")
-    doc_ref.update({"completed": True})
     return {"success": True}
 
 @router.post("/task/{document_id}/priority", response_model=dict)
 async def update_priority(document_id: str, new_priority: Priority, firebase: FirebaseConfig = Depends(get_firebase_config)):
     """Update the priority of a task"""
     doc_ref = firebase.db.collection("tasks").document(document_id)
-    doc = doc_ref.get()
-    if not doc.exists:
+    try:
+        await asyncio.to_thread(doc_ref.update, {"priority": new_priority})
+    except NotFound:
         raise HTTPException(status_code=404, detail="Task not found")
-    doc_ref.update({"priority": new_priority})
     return {"success": True}
\ No newline at end of file
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Production server: 2*cores+1 workers, libuv event loop, C HTTP parser.
+# Run from the backend/ directory.
+exec uvicorn main:app \
+    --host 0.0.0.0 \
+    --port 8000 \
+    --workers "$(python -c 'import os; print(2 * os.cpu_count() + 1)')" \
+    --loop uvloop \
+    --http httptools \
+    --log-level warning
@@ -1,5 +1,5 @@
 # dump firestore collection to json
-import json
+import orjson
 import firebase_admin
 from google.cloud import firestore
 
@@ -12,11 +12,21 @@ def dump_collection_to_json(collection_name: str, output_file: str):
         output_file: Output JSON file
     """
     db = firestore.Client()
-    docs = db.collection(collection_name).get()
-    print(f'Dumping {len(docs)} documents to {output_file}...')
-    data = {doc.id: doc.to_dict() for doc in docs}
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=4, default=str)
+    print(f'Dumping {collection_name} to {output_file}...')
+    count = 0
+    # Stream documents and write incrementally so peak memory stays at
+    # one document instead of the whole collection
+    with open(output_file, 'wb') as f:
+        f.write(b'{')
+        for doc in db.collection(collection_name).stream():
+            if count:
+                f.write(b',')
+            f.write(orjson.dumps(doc.id))
+            f.write(b':')
+            f.write(orjson.dumps(doc.to_dict(), default=str))
+            count += 1
+        f.write(b'}')
+    print(f'Dumped {count} documents')
 
 def query_collection(collection_name: str, query: list):
     """
@@ -7,8 +7,12 @@ from dataclasses import dataclass
 from enum import Enum
 import operator
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.types import BatchSettings
 
-publisher = pubsub_v1.PublisherClient()
+# Batch settings let multiple triggered rules coalesce into one publish RPC
+publisher = pubsub_v1.PublisherClient(
+    batch_settings=BatchSettings(max_messages=100, max_latency=0.01, max_bytes=1024 * 1024)
+)
 
 topic_name = 'projects/{project_id}/topics/{topic}'.format(
     project_id="hackutd-9aec1",
@@ -31,20 +35,52 @@ class Operation(Enum):
     CONTAINS = "contains"
     NOT_CONTAINS = "not_contains"
 
+def _coerce(latest_value: Any, target_value: Any) -> Any:
+    """Align value types the same way evaluate_condition does; None on failure."""
+    try:
+        if isinstance(latest_value, str) and not isinstance(target_value, str):
+            return type(target_value)(latest_value)
+        if isinstance(target_value, str) and not isinstance(latest_value, str):
+            return str(latest_value)
+    except (ValueError, TypeError):
+        return None
+    return latest_value
+
 @dataclass
 class Condition:
     topic: str
-    operation: Operation
+    # Raw operation string (">", "==", ...); skips Enum materialization on the hot path
+    operation: str
     value: Any
-    
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Condition':
         return cls(
             topic=data['topic'],
-            operation=Operation(data['operation']),
+            operation=data['operation'],
             value=data['value']
         )
 
+    def compile(self, ops: Dict[str, Any]):
+        """Compile this condition into a closure over a get_value callable."""
+        op_func = ops[self.operation]
+        topic = self.topic
+        target = self.value
+
+        def check(get_value) -> bool:
+            latest = get_value(topic)
+            if latest is None:
+                return False
+            latest = _coerce(latest, target)
+            if latest is None:
+                return False
+            try:
+                return bool(op_func(latest, target))
+            except Exception:
+                return False
+
+        return check
+
 @dataclass
 class LogicalExpression:
     operator: Operation
@@ -62,9 +98,18 @@ class LogicalExpression:
             else:
                 # This is a condition
                 operands.append(Condition.from_dict(operand))
-        
+
         return cls(operator=operator, operands=operands)
 
+    def compile(self, ops: Dict[str, Any]):
+        """Compile the expression tree into one short-circuiting closure."""
+        fns = [operand.compile(ops) for operand in self.operands]
+        if self.operator == Operation.AND:
+            return lambda get_value: all(fn(get_value) for fn in fns)
+        if self.operator == Operation.OR:
+            return lambda get_value: any(fn(get_value) for fn in fns)
+        raise ValueError(f"Invalid logical operator: {self.operator}")
+
 @dataclass
 class Rule:
     id: str
@@ -72,7 +117,9 @@ class Rule:
     logic: LogicalExpression
     description: str = ""
     enabled: bool = True
-    
+    # Compiled form of `logic`; set at load time, None means fall back to the tree walk
+    compiled: Any = None
+
     @classmethod
     def from_dict(cls, rule_id: str, data: Dict[str, Any]) -> 'Rule':
         return cls(
@@ -83,20 +130,28 @@ class Rule:
             enabled=data.get('enabled', True)
         )
 
+# Compiled rules survive warm invocations; keyed by rule id, invalidated
+# when the Firestore document's update_time changes
+_COMPILED_CACHE: Dict[str, Any] = {}
+
 class RulesEngine:
     def __init__(self):
         self.db = firestore.Client()
-        
-        # Operation handlers
+        # Per-invocation cache: many rules reference the same topics, and a
+        # topic's value cannot change within one evaluation pass
+        self._topic_cache: Dict[str, Any] = {}
+
+        # Operation handlers, keyed by the raw operation string so condition
+        # dispatch is a plain dict lookup with no Enum round-trip
         self.ops = {
-            Operation.GREATER_THAN: operator.gt,
-            Operation.GREATER_EQUAL: operator.ge,
-            Operation.LESS_THAN: operator.lt,
-            Operation.LESS_EQUAL: operator.le,
-            Operation.EQUALS: operator.eq,
-            Operation.NOT_EQUALS: operator.ne,
-            Operation.CONTAINS: lambda x, y: y in x,
-            Operation.NOT_CONTAINS: lambda x, y: y not in x
+            '>': operator.gt,
+            '>=': operator.ge,
+            '<': operator.lt,
+            '<=': operator.le,
+            '==': operator.eq,
+            '!=': operator.ne,
+            'contains': lambda x, y: y in x,
+            'not_contains': lambda x, y: y not in x
         }
     
     def _safe_topic_id(self, topic: str) -> str:
@@ -105,6 +160,8 @@ class RulesEngine:
     
     def get_latest_value(self, topic: str) -> Any:
         """Get the latest value for a topic from Firestore."""
+        if topic in self._topic_cache:
+            return self._topic_cache[topic]
         try:
             collection_name = f"mqtt_values/{self._safe_topic_id(topic)}/messages"
             docs = self.db.collection(collection_name).order_by('timestamp', direction=firestore.Query.DESCENDING).limit(1).get()
@@ -119,7 +176,8 @@ class RulesEngine:
                 if not last_message:
                     logger.warning(f"No messages found for topic: {topic}")
                     return None
-                
+
+                self._topic_cache[topic] = last_message
                 return last_message
         except Exception as e:
             logger.error(f"Error getting latest value for topic {topic}: {e}")
@@ -135,7 +193,7 @@ class RulesEngine:
                     'result': False,
                     'details': {
                         'topic': condition.topic,
-                        'operation': condition.operation.value,
+                        'operation': condition.operation,
                         'target_value': condition.value,
                         'current_value': None,
                         'error': 'No value available'
@@ -149,7 +207,7 @@ class RulesEngine:
                     'result': False,
                     'details': {
                         'topic': condition.topic,
-                        'operation': condition.operation.value,
+                        'operation': condition.operation,
                         'error': f"Unknown operation: {condition.operation}"
                     }
                 }
@@ -165,7 +223,7 @@ class RulesEngine:
                     'result': False,
                     'details': {
                         'topic': condition.topic,
-                        'operation': condition.operation.value,
+                        'operation': condition.operation,
                         'target_value': condition.value,
                         'current_value': latest_value,
                         'error': 'Type conversion failed'
@@ -179,7 +237,7 @@ class RulesEngine:
                 'result': result,
                 'details': {
                     'topic': condition.topic,
-                    'operation': condition.operation.value,
+                    'operation': condition.operation,
                     'target_value': condition.value,
                     'current_value': latest_value
                 }
@@ -190,43 +248,54 @@ class RulesEngine:
                 'result': False,
                 'details': {
                     'topic': condition.topic,
-                    'operation': condition.operation.value,
+                    'operation': condition.operation,
                     'error': str(e)
                 }
             }
     
+    def _evaluate_operand(self, operand, details: list) -> bool:
+        """Evaluate one operand (nested expression or condition), recording its details."""
+        if isinstance(operand, LogicalExpression):
+            # Recursively evaluate nested expression
+            evaluation = self.evaluate_expression(operand)
+            details.append(evaluation)
+        else:
+            # Evaluate condition
+            evaluation = self.evaluate_condition(operand)
+            details.append(evaluation['details'])
+        return evaluation['result']
+
     def evaluate_expression(self, expr: LogicalExpression) -> Dict[str, Any]:
-        """Recursively evaluate a logical expression."""
+        """Recursively evaluate a logical expression with short-circuiting."""
         try:
-            results = []
             details = []
-            
-            for operand in expr.operands:
-                if isinstance(operand, LogicalExpression):
-                    # Recursively evaluate nested expression
-                    evaluation = self.evaluate_expression(operand)
-                    results.append(evaluation['result'])
-                    details.append(evaluation)
-                else:
-                    # Evaluate condition
-                    evaluation = self.evaluate_condition(operand)
-                    results.append(evaluation['result'])
-                    details.append(evaluation['details'])
-            
-            # Combine results based on logical operator
+
+            # Evaluate conditions before nested expressions: they are cheaper,
+            # and a short-circuit here can skip whole subtrees of Firestore reads
+            operands = sorted(expr.operands, key=lambda o: isinstance(o, LogicalExpression))
+
+            # Short-circuit: the first False decides an AND, the first True an OR
             if expr.operator == Operation.AND:
-                final_result = all(results)
+                final_result = True
+                for operand in operands:
+                    if not self._evaluate_operand(operand, details):
+                        final_result = False
+                        break
             elif expr.operator == Operation.OR:
-                final_result = any(results)
+                final_result = False
+                for operand in operands:
+                    if self._evaluate_operand(operand, details):
+                        final_result = True
+                        break
             else:
                 raise ValueError(f"Invalid logical operator: {expr.operator}")
-            
+
             return {
                 'result': final_result,
                 'operator': expr.operator.value,
                 'operands': details
             }
-            
+
         except Exception as e:
             logger.error(f"Error evaluating expression: {str(e)}")
             return {
@@ -246,6 +315,15 @@ class RulesEngine:
                     rule_data = rule_doc.to_dict()
                     if rule_data.get('enabled', True):
                         rule = Rule.from_dict(rule_doc.id, rule_data)
+                        cached = _COMPILED_CACHE.get(rule_doc.id)
+                        if cached and cached[0] == rule_doc.update_time:
+                            rule.compiled = cached[1]
+                        else:
+                            try:
+                                rule.compiled = rule.logic.compile(self.ops)
+                                _COMPILED_CACHE[rule_doc.id] = (rule_doc.update_time, rule.compiled)
+                            except Exception as e:
+                                logger.warning(f"Could not compile rule {rule_doc.id}, falling back to tree walk: {str(e)}")
                         rules.append(rule)
                 except Exception as e:
                     logger.error(f"Error parsing rule {rule_doc.id}: {str(e)}")
@@ -259,8 +337,12 @@ class RulesEngine:
     def evaluate_rule(self, rule: Rule) -> Dict[str, Any]:
         """Evaluate a single rule and return the results."""
         try:
-            evaluation = self.evaluate_expression(rule.logic)
-            
+            if rule.compiled is not None:
+                # Hot path: one closure call, topic reads go through the memoized getter
+                evaluation = {'result': rule.compiled(self.get_latest_value), 'compiled': True}
+            else:
+                evaluation = self.evaluate_expression(rule.logic)
+
             return {
                 'rule_id': rule.id,
                 'rule_name': rule.name,
@@ -281,21 +363,27 @@ class RulesEngine:
     
     def evaluate_all_rules(self) -> List[Dict[str, Any]]:
         """Evaluate all enabled rules and return results."""
+        self._topic_cache.clear()
         rules = self.get_rules()
         results = []
-        
+        publish_futures = []
+
         for rule in rules:
             result = self.evaluate_rule(rule)
             results.append(result)
-            
+
             if result.get('triggered', False):
                 logger.info(f"Rule '{rule.name}' ({rule.id}) triggered!")
-                future = publisher.publish(topic_name, rule.id.encode())
-                logger.debug(future.result())
+                # Don't block per rule; let the batched publisher coalesce
+                publish_futures.append(publisher.publish(topic_name, rule.id.encode()))
                 logger.info(f"Details: {result}")
             else:
                 logger.debug(f"Rule '{rule.name}' not triggered")
-        
+
+        # Wait once for all publishes instead of per-rule .result() calls
+        for future in publish_futures:
+            future.result(timeout=30)
+
         return results
 
 @functions_framework.http
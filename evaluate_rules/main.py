@@ -1,15 +1,24 @@
 import functions_framework
 from google.cloud import firestore
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import logging
+import operator
+import os
+import threading
+import time
 from google.cloud import pubsub_v1
+import hashlib
 import json
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+import orjson
+
+# Set up logging; production runs at INFO unless LOG_LEVEL says otherwise
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
 logger = logging.getLogger(__name__)
 
 publisher = pubsub_v1.PublisherClient()
@@ -19,6 +28,8 @@ topic_name = 'projects/{project_id}/topics/{topic}'.format(
     topic='action_queue',
 )
 
+_PUBLISH_ATTRS = {'Content-Type': 'application/json'}
+
 class NodeType(Enum):
     GET_DATA = "get_data"
     COMPARE = "compare"
@@ -37,25 +48,76 @@ class Operation(Enum):
     CONTAINS = "contains"
     NOT_CONTAINS = "not_contains"
 
-@dataclass
-class Node:
-    id: str
-    type: NodeType
-    properties: Dict[str, Any]
-    next: List[str]
-    next_true: Optional[List[str]] = None
-    next_false: Optional[List[str]] = None
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Node':
-        return cls(
-            id=data['id'],
-            type=NodeType(data['type']),
-            properties=data.get('properties', {}),
-            next=data.get('next', []),
-            next_true=data.get('next_true', []),
-            next_false=data.get('next_false', [])
+# Operator table keyed by the raw operator string, built once at import.
+# C-implemented operator callables skip the Python frame a lambda would pay
+_OPS_BY_STR = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'contains': operator.contains,
+    'not_contains': lambda x, y: not operator.contains(x, y)
+}
+
+# Compiled rule functions surviving warm invocations: rule id -> (content hash, fn)
+_COMPILED_RULES: Dict[str, Any] = {}
+
+# Topic values surviving warm invocations: topic -> (monotonic fetch time, value).
+# Most sensors report every tens of seconds, so a short TTL absorbs the bulk
+# of Firestore reads without serving stale data for long
+_VALUE_CACHE: Dict[str, Any] = {}
+VALUE_TTL_SEC = 5.0
+
+# Single-pass character mapping instead of four chained str.replace calls
+_TOPIC_TRANS = str.maketrans({'/': '_', '.': '_', '#': 'hash', '+': 'plus'})
+
+@functools.lru_cache(maxsize=512)
+def _safe_topic_id(topic: str) -> str:
+    """Convert MQTT topic to Firestore collection name."""
+    return topic.translate(_TOPIC_TRANS)
+
+# Integer node-type codes for the interpreter tables; cheaper than Enum
+# lookups and comparisons in the walk loop
+_NT_GET_DATA, _NT_COMPARE, _NT_AND, _NT_OR, _NT_PUBLISH, _NT_END = range(6)
+_NT_CODES = {'get_data': _NT_GET_DATA, 'compare': _NT_COMPARE, 'and': _NT_AND,
+             'or': _NT_OR, 'publish': _NT_PUBLISH, 'end': _NT_END}
+_NT_NAMES = ['get_data', 'compare', 'and', 'or', 'publish', 'end']
+
+# Pre-parsed interpreter tables per rule id -> (content hash, start id, node table)
+_PARSED_RULES: Dict[str, Any] = {}
+
+def _content_hash(rule: Dict[str, Any]) -> str:
+    """Hash of the parts of a rule that affect evaluation."""
+    content = json.dumps({'start_node': rule['start_node'], 'nodes': rule['nodes']},
+                         sort_keys=True, default=str)
+    return hashlib.md5(content.encode()).hexdigest()
+
+def _rule_version(rule: Dict[str, Any]) -> Any:
+    """Cache-invalidation token for a rule.
+
+    Firestore's update_time metadata (attached in get_rules) is free and
+    changes on every edit; hashing the rule body is the fallback when the
+    rule didn't come from a document snapshot.
+    """
+    return rule.get('_update_time') or _content_hash(rule)
+
+def _parse_rule(rule: Dict[str, Any]):
+    """Parse a rule's nodes into frozen tuples with pre-resolved operators."""
+    nodes = {}
+    for node in rule['nodes']:
+        props = node.get('properties', {})
+        op_fn = _OPS_BY_STR.get(props.get('operator')) if node['type'] == 'compare' else None
+        nodes[node['id']] = (
+            _NT_CODES[node['type']],
+            props,
+            node.get('next', []),
+            node.get('next_true', []),
+            node.get('next_false', []),
+            op_fn,
         )
+    return rule['start_node'], nodes
 
 @dataclass
 class NodeResult:
@@ -66,185 +128,353 @@ class NodeResult:
 class NodeBasedRulesEngine:
     def __init__(self):
         self.db = firestore.Client()
-        self.execution_context: Dict[str, Any] = {}
-        
+        # Per-invocation topic cache shared across rules; a topic's value
+        # cannot change within a single evaluation pass. Rules evaluate on
+        # worker threads, so writes are guarded by a lock
+        self._value_cache: Dict[str, Any] = {}
+        self._value_cache_lock = threading.Lock()
+        # In-flight Pub/Sub publishes, drained once per evaluation pass
+        self._pending_publishes: List[Any] = []
+        self._pending_lock = threading.Lock()
+
+    def _prefetch_topics(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch every get_data topic of a rule concurrently instead of one RTT per node."""
+        topics = [node.get('properties', {}).get('topic')
+                  for node in rule.get('nodes', []) if node.get('type') == 'get_data']
+        topics = [topic for topic in topics if topic]
+        if not topics:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(topics)) as executor:
+            return dict(zip(topics, executor.map(self.get_latest_value, topics)))
+
     def _safe_topic_id(self, topic: str) -> str:
         """Convert MQTT topic to Firestore collection name."""
-        return topic.replace('/', '_').replace('.', '_').replace('#', 'hash').replace('+', 'plus')
-    
+        return _safe_topic_id(topic)
+
+    def _cache_value(self, topic: str, value: Any) -> None:
+        with self._value_cache_lock:
+            self._value_cache[topic] = value
+            _VALUE_CACHE[topic] = (time.monotonic(), value)
+
     def get_latest_value(self, topic: str) -> Any:
         """Get the latest value for a topic from Firestore."""
+        if topic in self._value_cache:
+            return self._value_cache[topic]
+        ts, cached = _VALUE_CACHE.get(topic, (0.0, None))
+        if ts and time.monotonic() - ts < VALUE_TTL_SEC:
+            with self._value_cache_lock:
+                self._value_cache[topic] = cached
+            return cached
         try:
-            collection_name = f"mqtt_values/{self._safe_topic_id(topic)}/messages"
-            docs = self.db.collection(collection_name).order_by('timestamp', direction=firestore.Query.DESCENDING).limit(1).get()
-            
+            topic_id = _safe_topic_id(topic)
+            # The ingestor keeps the latest value on the parent doc, so a
+            # point read replaces the sorted subcollection query
+            doc = self.db.document(f"mqtt_values/{topic_id}").get()
+            if doc.exists and 'value' in (data := doc.to_dict()):
+                value = data['value']
+                self._cache_value(topic, value)
+                return value
+
+            # Fallback for topics last written before the parent doc carried
+            # the value: newest doc in the messages subcollection
+            docs = self.db.collection(f"mqtt_values/{topic_id}/messages").order_by('timestamp', direction=firestore.Query.DESCENDING).limit(1).get()
+
             for doc in docs:
                 metadata_doc = doc.to_dict()
-                return metadata_doc.get('value')
-                
+                value = metadata_doc.get('value')
+                self._cache_value(topic, value)
+                return value
+
             return None
         except Exception as e:
             logger.error(f"Error getting latest value for topic {topic}: {e}")
             return None
 
-    def execute_get_data_node(self, node: Node) -> NodeResult:
+    def execute_get_data_node(self, props: Dict[str, Any], prefetched: Dict[str, Any]) -> NodeResult:
         """Execute a get_data node."""
-        logging.debug(f"Execute Get Data Node: {node.properties}")
-        topic = node.properties.get('topic')
+        logger.debug("Execute Get Data Node: %s", props)
+        topic = props.get('topic')
         if not topic:
             return NodeResult(False, None, {'error': 'No topic specified'})
-        
-        value = self.get_latest_value(topic)
+
+        value = prefetched[topic] if topic in prefetched else self.get_latest_value(topic)
         return NodeResult(
             success=value is not None,
             value=value,
             details={'topic': topic, 'value': value}
         )
 
-    def execute_compare_node(self, node: Node) -> NodeResult:
+    def execute_compare_node(self, props: Dict[str, Any], op_fn, ctx: Dict[str, Any]) -> NodeResult:
         """Execute a compare node."""
 
-        logging.debug(f"Execute Compare Node: {node.properties}")
+        logger.debug("Execute Compare Node: %s", props)
         try:
             # Get input1 - either from context or direct value
-            input1_ref = node.properties['input1']
-            input1 = self.execution_context.get(input1_ref) if input1_ref in self.execution_context else input1_ref
-            
+            input1_ref = props['input1']
+            input1 = ctx[input1_ref] if input1_ref in ctx else input1_ref
+
             # Get input2 - either from context or direct value
-            input2_ref = node.properties['input2']
-            input2 = self.execution_context.get(input2_ref) if input2_ref in self.execution_context else input2_ref
-            
-            operation = Operation(node.properties['operator'])
-            
-            ops = {
-                Operation.GREATER_THAN: lambda x, y: x > y,
-                Operation.GREATER_EQUAL: lambda x, y: x >= y,
-                Operation.LESS_THAN: lambda x, y: x < y,
-                Operation.LESS_EQUAL: lambda x, y: x <= y,
-                Operation.EQUALS: lambda x, y: x == y,
-                Operation.NOT_EQUALS: lambda x, y: x != y,
-                Operation.CONTAINS: lambda x, y: y in x,
-                Operation.NOT_CONTAINS: lambda x, y: y not in x
-            }
-            
-            if operation not in ops:
-                return NodeResult(False, None, {'error': f'Invalid operation: {operation}'})
-            
-            result = ops[operation](input1, input2)
+            input2_ref = props['input2']
+            input2 = ctx[input2_ref] if input2_ref in ctx else input2_ref
+
+            if op_fn is None:
+                return NodeResult(False, None, {'error': f"Invalid operation: {props.get('operator')}"})
+
+            result = op_fn(input1, input2)
             return NodeResult(
                 success=True,
                 value=result,
                 details={
                     'input1': input1,
                     'input2': input2,
-                    'operation': operation.value,
+                    'operation': props.get('operator'),
                     'result': result
                 }
             )
         except Exception as e:
             return NodeResult(False, None, {'error': str(e)})
 
-    def execute_logical_node(self, node: Node) -> NodeResult:
+    def execute_logical_node(self, props: Dict[str, Any], is_and: bool, ctx: Dict[str, Any]) -> NodeResult:
         """Execute an AND or OR node."""
-        logging.debug(f"Execute Logical Node: {node.properties}")
+        logger.debug("Execute Logical Node: %s", props)
         try:
-            input_values = [self.execution_context.get(input_id) for input_id in node.properties['inputs']]
-            
-            if node.type == NodeType.AND:
-                result = all(input_values)
+            inputs = props['inputs']
+
+            # Generator feeds all()/any() so they short-circuit on the first
+            # deciding input instead of materializing every value first
+            if is_and:
+                result = all(ctx.get(input_id) for input_id in inputs)
             else:  # OR
-                result = any(input_values)
-                
+                result = any(ctx.get(input_id) for input_id in inputs)
+
             return NodeResult(
                 success=True,
                 value=result,
                 details={
-                    'inputs': input_values,
-                    'operation': node.type.value,
+                    'inputs': [ctx.get(input_id) for input_id in inputs]
+                    if logger.isEnabledFor(logging.DEBUG) else '<elided>',
+                    'operation': 'and' if is_and else 'or',
                     'result': result
                 }
             )
         except Exception as e:
             return NodeResult(False, None, {'error': str(e)})
 
-    def execute_publish_node(self, node: Node) -> NodeResult:
-        """Execute a publish node."""
-        logging.debug(f"Publishing message: {node.properties}")
+    def _publish(self, action: Any, action_data: Any) -> bool:
+        """Publish an action message to the action queue; True on success."""
         try:
-            action = node.properties.get('action')
-            action_data = node.properties.get('action_data', {})
-
             data = {
                 'action': action,
                 'action_data': action_data
             }
 
-            attributes = {
-                'Content-Type': 'application/json'
-            }
+            # Fire and forget: the next node never depends on the server ACK,
+            # so don't pay a round-trip here. Failures surface via the
+            # callback and the drain at the end of the pass
+            future = publisher.publish(topic_name, orjson.dumps(data), **_PUBLISH_ATTRS)
+            future.add_done_callback(
+                lambda f: logger.error(f"Error publishing action {action}: {f.exception()}")
+                if f.exception() else None)
+            with self._pending_lock:
+                self._pending_publishes.append(future)
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing action {action}: {str(e)}")
+            return False
 
-            future = publisher.publish(topic_name, json.dumps(data).encode(), **attributes)
-            future.result()
-            
+    def _drain_publishes(self) -> None:
+        """Wait once for every publish issued during this pass."""
+        with self._pending_lock:
+            pending, self._pending_publishes = self._pending_publishes, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass  # already logged by the done callback
+
+    def execute_publish_node(self, props: Dict[str, Any]) -> NodeResult:
+        """Execute a publish node."""
+        logger.debug("Publishing message: %s", props)
+        action = props.get('action')
+        action_data = props.get('action_data', {})
+
+        if self._publish(action, action_data):
             return NodeResult(
                 success=True,
                 value="published",
                 details={'action': action, 'action_data': action_data}
             )
-        except Exception as e:
-            return NodeResult(False, None, {'error': str(e)})
+        return NodeResult(False, None, {'error': 'publish failed'})
 
-    def execute_node(self, node: Node) -> NodeResult:
-        """Execute a single node based on its type."""
-        node_executors = {
-            NodeType.GET_DATA: self.execute_get_data_node,
-            NodeType.COMPARE: self.execute_compare_node,
-            NodeType.AND: self.execute_logical_node,
-            NodeType.OR: self.execute_logical_node,
-            NodeType.PUBLISH: self.execute_publish_node,
-            NodeType.END: lambda _: NodeResult(True, None, {})
-        }
-        
-        executor = node_executors.get(node.type)
-        if not executor:
-            return NodeResult(False, None, {'error': f'Unknown node type: {node.type}'})
-        
-        result = executor(node)
-        self.execution_context[node.id] = result.value
+    def execute_node(self, node_id: str, node: tuple, ctx: Dict[str, Any],
+                     prefetched: Dict[str, Any]) -> NodeResult:
+        """Execute a single pre-parsed node based on its type code."""
+        type_code, props = node[0], node[1]
+        if type_code == _NT_GET_DATA:
+            result = self.execute_get_data_node(props, prefetched)
+        elif type_code == _NT_COMPARE:
+            result = self.execute_compare_node(props, node[5], ctx)
+        elif type_code == _NT_AND or type_code == _NT_OR:
+            result = self.execute_logical_node(props, type_code == _NT_AND, ctx)
+        elif type_code == _NT_PUBLISH:
+            result = self.execute_publish_node(props)
+        elif type_code == _NT_END:
+            result = NodeResult(True, None, {})
+        else:
+            result = NodeResult(False, None, {'error': f'Unknown node type: {type_code}'})
+
+        ctx[node_id] = result.value
         return result
 
+    def _compile_rule(self, rule: Dict[str, Any]):
+        """Compile a rule's node graph into a straight-line Python function.
+
+        The generated function takes (ctx, publish) where ctx maps topic ->
+        latest value and publish(action, action_data) -> bool, and returns
+        whether the rule triggered. Raises on graphs it cannot compile.
+        """
+        nodes = {node['id']: node for node in rule['nodes']}
+        lines = ['def _rule_fn(ctx, publish):', '    v = {}', '    triggered = False']
+
+        def emit(node_id: str, indent: int, path: frozenset) -> None:
+            if node_id in path:
+                raise ValueError(f"Cycle at node {node_id}")
+            node = nodes[node_id]
+            pad = '    ' * indent
+            node_type = node.get('type')
+
+            if node_type == 'end':
+                lines.append(f"{pad}return triggered")
+                return
+
+            if node_type == 'get_data':
+                topic = node['properties']['topic']
+                lines.append(f"{pad}v[{node_id!r}] = ctx.get({topic!r})")
+                lines.append(f"{pad}if v[{node_id!r}] is None:")
+                lines.append(f"{pad}    return triggered")
+            elif node_type == 'compare':
+                props = node['properties']
+                op = props['operator']
+                if op not in _OPS_BY_STR:
+                    raise ValueError(f"Unknown operator: {op}")
+                # Inputs referencing other nodes resolve from v; anything else is a literal
+                input1 = f"v[{props['input1']!r}]" if props['input1'] in nodes else repr(props['input1'])
+                input2 = f"v[{props['input2']!r}]" if props['input2'] in nodes else repr(props['input2'])
+                lines.append(f"{pad}v[{node_id!r}] = _OPS_BY_STR[{op!r}]({input1}, {input2})")
+                next_true = node.get('next_true') or []
+                next_false = node.get('next_false') or []
+                lines.append(f"{pad}if v[{node_id!r}]:")
+                if next_true:
+                    emit(next_true[0], indent + 1, path | {node_id})
+                else:
+                    lines.append(f"{pad}    return triggered")
+                lines.append(f"{pad}else:")
+                if next_false:
+                    emit(next_false[0], indent + 1, path | {node_id})
+                else:
+                    lines.append(f"{pad}    return triggered")
+                return
+            elif node_type in ('and', 'or'):
+                inputs = node['properties']['inputs']
+                combine = 'all' if node_type == 'and' else 'any'
+                args = ', '.join(f"v.get({input_id!r})" for input_id in inputs)
+                lines.append(f"{pad}v[{node_id!r}] = {combine}([{args}])")
+            elif node_type == 'publish':
+                props = node.get('properties', {})
+                lines.append(f"{pad}if publish({props.get('action')!r}, {props.get('action_data', {})!r}):")
+                lines.append(f"{pad}    triggered = True")
+            else:
+                raise ValueError(f"Unknown node type: {node_type}")
+
+            next_nodes = node.get('next') or []
+            if not next_nodes:
+                lines.append(f"{pad}return triggered")
+                return
+            emit(next_nodes[0], indent, path | {node_id})
+
+        emit(rule['start_node'], 1, frozenset())
+        namespace = {'_OPS_BY_STR': _OPS_BY_STR}
+        exec('\n'.join(lines), namespace)
+        return namespace['_rule_fn']
+
+    def _compiled_fn(self, rule: Dict[str, Any]):
+        """Return the cached compiled function for a rule, compiling on change."""
+        rule_id = rule.get('id')
+        try:
+            version = _rule_version(rule)
+            cached = _COMPILED_RULES.get(rule_id)
+            if cached and cached[0] == version:
+                return cached[1]
+            fn = self._compile_rule(rule)
+            _COMPILED_RULES[rule_id] = (version, fn)
+            return fn
+        except Exception as e:
+            logger.warning(f"Could not compile rule {rule_id}, using interpreter: {str(e)}")
+            return None
+
     def execute_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a complete rule by traversing its node tree."""
+        """Execute a complete rule, preferring its compiled form."""
+        fn = self._compiled_fn(rule)
+        if fn is not None:
+            prefetched = self._prefetch_topics(rule)
+            try:
+                triggered = fn(prefetched, self._publish)
+                return {
+                    'rule_id': rule.get('id'),
+                    'rule_name': rule.get('name'),
+                    'triggered': triggered,
+                    'evaluation_time': datetime.now().isoformat(),
+                    'node_results': []
+                }
+            except Exception as e:
+                logger.error(f"Compiled rule {rule.get('id')} failed, falling back to interpreter: {str(e)}")
+        return self._execute_rule_interpreted(rule)
+
+    def _parsed_rule(self, rule: Dict[str, Any]):
+        """Return the cached parsed node tables for a rule, reparsing on change."""
+        rule_id = rule.get('id')
+        version = _rule_version(rule)
+        cached = _PARSED_RULES.get(rule_id)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+        start_node, nodes = _parse_rule(rule)
+        _PARSED_RULES[rule_id] = (version, start_node, nodes)
+        return start_node, nodes
+
+    def _execute_rule_interpreted(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a complete rule by traversing its pre-parsed node tables."""
         try:
-            self.execution_context = {}
-            nodes = {node['id']: Node.from_dict(node) for node in rule['nodes']}
-            current_node = nodes[rule['start_node']]
+            ctx: Dict[str, Any] = {}
+            prefetched = self._prefetch_topics(rule)
+            start_node, nodes = self._parsed_rule(rule)
+            current_id = start_node
+            node = nodes[current_id]
             results = []
-            
-            while current_node.type != NodeType.END:
-                result = self.execute_node(current_node)
+
+            while node[0] != _NT_END:
+                result = self.execute_node(current_id, node, ctx, prefetched)
                 results.append({
-                    'node_id': current_node.id,
-                    'type': current_node.type.value,
+                    'node_id': current_id,
+                    'type': _NT_NAMES[node[0]],
                     'result': result.value,
                     'details': result.details
                 })
-                
+
                 if not result.success:
                     break
-                
+
                 # Determine next node based on result
-                next_nodes = []
-                if current_node.type == NodeType.COMPARE:
-                    next_nodes = current_node.next_true if result.value else current_node.next_false
+                if node[0] == _NT_COMPARE:
+                    next_nodes = node[3] if result.value else node[4]
                 else:
-                    next_nodes = current_node.next
-                
+                    next_nodes = node[2]
+
                 if not next_nodes:
                     break
-                    
-                current_node = nodes[next_nodes[0]]
-            
+
+                current_id = next_nodes[0]
+                node = nodes[current_id]
+
             return {
                 'rule_id': rule.get('id'),
                 'rule_name': rule.get('name'),
@@ -266,55 +496,86 @@ class NodeBasedRulesEngine:
     def get_rules(self) -> List[Dict[str, Any]]:
         """Get all enabled rules from Firestore."""
         rules = []
+        now = datetime.now(timezone.utc)
         try:
-            rules_ref = self.db.collection('rules').get()
-            
+            # Filter enabled server-side; the interval check stays in Python
+            # because each rule carries its own interval. The scan only pulls
+            # the scheduling fields, so disqualified rules never download
+            # their node graphs
+            rules_ref = self.db.collection('rules').where('enabled', '==', True).select(['last_run', 'interval']).stream()
+            batch = self.db.batch()
+
             for rule_doc in rules_ref:
                 try:
-                    rule_data = rule_doc.to_dict()
-                    # Check if rule interval has passed
-                    last_run = datetime.fromisoformat(rule_data.get('last_run'))
-                    interval = rule_data.get('interval', 3600)
-                    if rule_data.get('enabled', True) and (datetime.now() - last_run).total_seconds() >= interval:
-                        logger.debug(f"Processing rule {rule_doc.id}")
-                        rule_data['id'] = rule_doc.id
+                    meta = rule_doc.to_dict()
+                    # Check if rule interval has passed. last_run written by
+                    # this engine is a native Timestamp and arrives as a
+                    # datetime; ISO strings remain for legacy documents
+                    last_run = meta.get('last_run')
+                    if isinstance(last_run, str):
+                        last_run = datetime.fromisoformat(last_run)
+                    if last_run.tzinfo is None:
+                        last_run = last_run.replace(tzinfo=timezone.utc)
+                    interval = meta.get('interval', 3600)
+                    if (now - last_run).total_seconds() >= interval:
+                        logger.debug("Processing rule %s", rule_doc.id)
+                        full_doc = rule_doc.reference.get()
+                        rule_data = full_doc.to_dict()
+                        rule_data['id'] = full_doc.id
+                        rule_data['_update_time'] = full_doc.update_time
                         rules.append(rule_data)
-                        # Update last run time
-                        rule_doc.reference.update({'last_run': datetime.now().isoformat()})
+                        # Update last run time as part of one batched write;
+                        # the server clock avoids skew between workers
+                        batch.update(rule_doc.reference, {'last_run': firestore.SERVER_TIMESTAMP})
                     else:
-                        logger.debug(f"Skipping rule {rule_doc.id} due to interval {interval} < {(datetime.now() - last_run).total_seconds()} or enabled: {rule_data.get('enabled')}")
+                        logger.debug("Skipping rule %s due to interval %s < %s", rule_doc.id, interval, (now - last_run).total_seconds())
                 except Exception as e:
                     logger.error(f"Error parsing rule {rule_doc.id}: {str(e)}")
                     continue
-                    
+
+            if rules:
+                batch.commit()
+
         except Exception as e:
             logger.error(f"Error getting rules: {str(e)}")
-        
+
         return rules
 
     def evaluate_all_rules(self) -> List[Dict[str, Any]]:
-        """Evaluate all enabled rules and return results."""
+        """Evaluate all enabled rules concurrently and return results."""
+        self._value_cache.clear()
         rules = self.get_rules()
-        results = []
-        
-        for rule in rules:
-            result = self.execute_rule(rule)
-            results.append(result)
-            
+        if not rules:
+            return []
+
+        # Rules are independent and I/O bound, so the total latency is the
+        # slowest rule instead of the sum of all of them
+        with ThreadPoolExecutor(max_workers=min(32, len(rules))) as executor:
+            results = list(executor.map(self.execute_rule, rules))
+
+        self._drain_publishes()
+
+        for rule, result in zip(rules, results):
             if result.get('triggered', True):
                 logger.info(f"Rule '{rule.get('name')}' ({rule.get('id')}) triggered!")
                 logger.info(f"Details: {result}")
             else:
-                logger.debug(f"Rule '{rule.get('name')}' not triggered")
-        
+                logger.debug("Rule '%s' not triggered", rule.get('name'))
+
         return results
 
+# Engine (and its gRPC channels) survives warm invocations; built lazily so
+# import never needs credentials
+_ENGINE: Optional[NodeBasedRulesEngine] = None
+
 @functions_framework.http
 def evaluate_rules(request):
     """Cloud Function entry point."""
+    global _ENGINE
     try:
-        engine = NodeBasedRulesEngine()
-        results = engine.evaluate_all_rules()
+        if _ENGINE is None:
+            _ENGINE = NodeBasedRulesEngine()
+        results = _ENGINE.evaluate_all_rules()
         
         return {
             'status': 'success',
@@ -1,5 +1,7 @@
-import json
+import functools
 import logging
+
+import orjson
 from typing import Dict, Any, Optional
 from datetime import datetime
 import paho.mqtt.client as mqtt
@@ -9,7 +11,9 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import signal
+import threading
 import sys
 import requests
 
@@ -23,6 +27,28 @@ logger = logging.getLogger(__name__)
 # Rule evaluation endpoint
 RULE_EVALUATION_URL = "https://us-central1-xxxx-xxxx.cloudfunctions.net/evaluate_rules"
 
+# Shared session keeps the TLS connection to the rule-eval function alive
+# across triggers instead of paying a fresh handshake per call
+_SESSION = requests.Session()
+_SESSION.mount('https://', requests.adapters.HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=requests.adapters.Retry(total=2, backoff_factor=0.1),
+))
+
+# Write micro-buffer limits: flush when either is hit
+FLUSH_MAX_ITEMS = 50
+FLUSH_INTERVAL_SEC = 0.5
+
+# Single-pass character mapping for topic -> document ID sanitizing;
+# must match the table the rules engine uses to read values back
+_TOPIC_TRANS = str.maketrans({'/': '_', '.': '_', '#': 'hash', '+': 'plus'})
+
+@functools.lru_cache(maxsize=1024)
+def _safe_topic_id(topic: str) -> str:
+    """Convert MQTT topic to a valid Firestore document ID."""
+    return topic.translate(_TOPIC_TRANS)
+
 @dataclass
 class MQTTConfig:
     broker: str
@@ -34,17 +60,30 @@ class MQTTConfig:
     client_id: Optional[str] = None
 
 class MQTTFirestoreIngestor:
-    def __init__(self, mqtt_config: MQTTConfig, collection_name: str):
+    def __init__(self, mqtt_config: MQTTConfig, collection_name: str, keep_history: bool = False):
         """
         Initialize the MQTT to Firestore ingestor.
-        
+
         Args:
             mqtt_config: MQTT configuration
             collection_name: Firestore collection to store messages in
+            keep_history: Also append each message to the per-topic
+                'messages' subcollection (doubles write cost)
         """
         self.mqtt_config = mqtt_config
         self.collection_name = collection_name
+        self.keep_history = keep_history
         self.is_running = False
+
+        # Rule-evaluation HTTP calls run here so the MQTT loop never blocks
+        # on a network round-trip
+        self._http_executor = ThreadPoolExecutor(max_workers=4)
+
+        # Micro-buffer of pending (doc_ref, data) writes committed as one
+        # Firestore batch instead of one RPC per message
+        self._write_buffer: list = []
+        self._buffer_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
         
         # Initialize Firestore
         self._init_firestore()
@@ -111,14 +150,13 @@ class MQTTFirestoreIngestor:
 
     def _safe_topic_id(self, topic: str) -> str:
         """Convert MQTT topic to a valid Firestore document ID."""
-        # Replace invalid characters with underscores
-        return topic.replace('/', '_').replace('.', '_')
+        return _safe_topic_id(topic)
     
     def _evaluate_rules(self, topic: str, value: float):
         """Send a GET request to evaluate rules for the given topic and value."""
         try:
             params = {'topic': topic, 'value': value}
-            response = requests.get(RULE_EVALUATION_URL, params=params)
+            response = _SESSION.get(RULE_EVALUATION_URL, params=params, timeout=5)
             response.raise_for_status()
             logger.info(f"Rule evaluation triggered for topic {topic} with value {value}")
             return response.json()
@@ -126,6 +164,36 @@ class MQTTFirestoreIngestor:
             logger.error(f"Error evaluating rules: {str(e)}", exc_info=True)
             return None
     
+    def _queue_write(self, doc_ref, doc_data):
+        """Buffer a write, flushing when the buffer fills or the timer fires."""
+        with self._buffer_lock:
+            self._write_buffer.append((doc_ref, doc_data))
+            should_flush = len(self._write_buffer) >= FLUSH_MAX_ITEMS
+            if not should_flush and self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_INTERVAL_SEC, self._flush_writes)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if should_flush:
+            self._flush_writes()
+
+    def _flush_writes(self):
+        """Commit all buffered writes in a single Firestore batch."""
+        with self._buffer_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            buffered, self._write_buffer = self._write_buffer, []
+        if not buffered:
+            return
+        try:
+            batch = self.db.batch()
+            for doc_ref, doc_data in buffered:
+                batch.set(doc_ref, doc_data, merge=True)
+            batch.commit()
+            logger.debug(f"Flushed {len(buffered)} buffered writes")
+        except Exception as e:
+            logger.error(f"Error flushing write buffer: {str(e)}", exc_info=True)
+
     def _on_message(self, client, userdata, message):
         """Callback for when a message is received."""
         try:
@@ -133,16 +201,16 @@ class MQTTFirestoreIngestor:
             
             # Parse payload as JSON
             try:
-                payload = json.loads(message.payload)
-                
+                payload = orjson.loads(message.payload)
+
                 # Validate payload structure
                 if not isinstance(payload, dict) or 'value' not in payload or 'immediate' not in payload:
                     raise ValueError("Invalid payload structure. Expected 'value' and 'immediate' fields.")
-                
+
                 value = payload['value']
                 immediate = payload['immediate']
-                
-            except json.JSONDecodeError as e:
+
+            except orjson.JSONDecodeError as e:
                 logger.error(f"Invalid JSON payload: {str(e)}")
                 return
             except ValueError as e:
@@ -159,22 +227,25 @@ class MQTTFirestoreIngestor:
                 'retain': message.retain,
                 'last_updated': datetime.now().isoformat()
             }
-            
+
             # Use topic as document ID (sanitized for Firestore)
             doc_id = self._safe_topic_id(message.topic)
-            
-            # Store in Firestore using set() to overwrite existing document
+
+            # One merged write on the parent doc carries the latest value, so
+            # readers get it with a single point read
             doc_ref = self.db.collection(self.collection_name).document(doc_id)
-            doc_ref.collection('messages').add(doc_data)
-            # add dummy field to doc_ref
-            doc_ref.set({'last_updated': datetime.now().isoformat()})
-            
+            self._queue_write(doc_ref, doc_data)
+            if self.keep_history:
+                self._queue_write(doc_ref.collection('messages').document(), doc_data)
+
             logger.info(f"Updated document for topic {message.topic} in Firestore")
             logger.debug(f"Document data: {doc_data}")
-            
-            # If immediate is True, trigger rule evaluation
+
+            # If immediate is True, flush this message's write and trigger
+            # rule evaluation off the MQTT thread
             if immediate:
-                self._evaluate_rules(message.topic, value)
+                self._flush_writes()
+                self._http_executor.submit(self._evaluate_rules, message.topic, value)
             
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}", exc_info=True)
@@ -217,8 +288,10 @@ class MQTTFirestoreIngestor:
         """Stop the ingestor."""
         logger.info("Stopping ingestor")
         self.is_running = False
+        self._flush_writes()
         self.mqtt_client.disconnect()
         self.mqtt_client.loop_stop()
+        self._http_executor.shutdown(wait=False)
 
 def main():
     # Example configuration
@@ -19,21 +19,28 @@ def initialize_firestore():
     return firestore.client()
 
 
+# Firestore caps a single batch at 500 operations
+BATCH_LIMIT = 500
+
+
 def insert_rules(rules: List[Dict[str, Any]]) -> None:
-    """Insert rules into Firestore."""
+    """Insert rules into Firestore using batched writes."""
     db = initialize_firestore()
     rules_ref = db.collection("rules")
 
-    for rule in rules:
+    # One committed batch per 500 rules instead of one RPC per rule
+    for start in range(0, len(rules), BATCH_LIMIT):
+        chunk = rules[start:start + BATCH_LIMIT]
         try:
-            # Use rule name as document ID (sanitized)
-            doc_id = rule["id"].lower().replace(" ", "_")
-            rules_ref.document(doc_id).set(rule)
-            logger.info(f"Inserted rule: {rule['id']}")
+            batch = db.batch()
+            for rule in chunk:
+                # Use rule name as document ID (sanitized)
+                doc_id = rule["id"].lower().replace(" ", "_")
+                batch.set(rules_ref.document(doc_id), rule)
+            batch.commit()
+            logger.info(f"Inserted {len(chunk)} rules")
         except Exception as e:
-            logger.error(
-                f"Error inserting rule {rule.get('name', 'unknown')}: {str(e)}"
-            )
+            logger.error(f"Error inserting rules batch: {str(e)}")
 
 
 def main():
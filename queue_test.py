@@ -1,23 +1,41 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, TypeVar, Generic
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, TypeVar, Generic
 from enum import Enum
-import json
+import numpy as np
+import orjson
 import paho.mqtt.client as mqtt
 from datetime import datetime
 import smtplib
 from email.message import EmailMessage
 import logging
+import operator
+import os
+import sys
+import threading
 from abc import ABC, abstractmethod
+from queue import Empty, SimpleQueue
 
-# Set up logging
+# Set up logging; production runs at INFO unless LOG_LEVEL says otherwise
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'INFO'),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# MQTT+ subscription prefixes for broker-side threshold filtering
+_OP_TO_PREFIX = {
+    "GREATER_EQUAL": "GTE",
+    "GREATER": "GT",
+    "LESS": "LT",
+    "LESS_EQUAL": "LTE",
+    "EQUALS": "EQ",
+    "NOT_EQUALS": "NEQ",
+}
+
 class Operation(Enum):
     AND = "AND"
     OR = "OR"
@@ -28,30 +46,149 @@ class Operation(Enum):
     EQUALS = "=="
     NOT_EQUALS = "!="
 
-@dataclass
+# C-implemented comparison callables, resolved once per Condition instead of
+# a dict lookup plus lambda frame per evaluation. AND/OR on a single
+# condition degrades to equality, matching evaluate_condition
+_OP_FUNCS = {
+    Operation.GREATER_EQUAL: operator.ge,
+    Operation.GREATER: operator.gt,
+    Operation.LESS: operator.lt,
+    Operation.LESS_EQUAL: operator.le,
+    Operation.EQUALS: operator.eq,
+    Operation.NOT_EQUALS: operator.ne,
+    Operation.AND: operator.eq,
+    Operation.OR: operator.eq,
+}
+
+# Integer opcodes and their NumPy counterparts for the vectorized evaluator
+_GE, _GT, _LT, _LE, _EQ, _NE = range(6)
+_NUMERIC_OPCODES = {
+    Operation.GREATER_EQUAL: _GE,
+    Operation.GREATER: _GT,
+    Operation.LESS: _LT,
+    Operation.LESS_EQUAL: _LE,
+    Operation.EQUALS: _EQ,
+    Operation.NOT_EQUALS: _NE,
+}
+_OPCODE_UFUNCS = (
+    (_GE, np.greater_equal),
+    (_GT, np.greater),
+    (_LT, np.less),
+    (_LE, np.less_equal),
+    (_EQ, np.equal),
+    (_NE, np.not_equal),
+)
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _eval_rules_kernel(values, topic_idx, opcodes, thresholds,
+                           rule_starts, rule_is_and, out):
+        """Short-circuiting evaluation of the SoA rule set in one fused loop."""
+        n_rules = rule_starts.shape[0]
+        n_conds = opcodes.shape[0]
+        for r in range(n_rules):
+            start = rule_starts[r]
+            end = rule_starts[r + 1] if r + 1 < n_rules else n_conds
+            is_and = rule_is_and[r]
+            result = is_and
+            for i in range(start, end):
+                v = values[topic_idx[i]]
+                if v != v:  # NaN: topic not seen yet
+                    ok = False
+                else:
+                    t = thresholds[i]
+                    op = opcodes[i]
+                    if op == _GE:
+                        ok = v >= t
+                    elif op == _GT:
+                        ok = v > t
+                    elif op == _LT:
+                        ok = v < t
+                    elif op == _LE:
+                        ok = v <= t
+                    elif op == _EQ:
+                        ok = v == t
+                    else:
+                        ok = v != t
+                if is_and:
+                    if not ok:
+                        result = False
+                        break
+                elif ok:
+                    result = True
+                    break
+            out[r] = result
+else:
+    _eval_rules_kernel = None
+
+@dataclass(slots=True, frozen=True)
 class Condition(Generic[T]):
     topic: str
     operation: Operation
     value: T
-    
+    # Dotted path to the field that feeds the condition when the topic
+    # publishes JSON objects, e.g. "value" or "payload.temp"
+    json_path: Optional[str] = None
+    _op_func: Any = field(init=False, repr=False, compare=False, default=None)
+    # Int opcode for the vectorized evaluator; -1 for non-numeric operations
+    _opcode: int = field(init=False, repr=False, compare=False, default=-1)
+
     def __post_init__(self):
         # Validate operation type
         if not isinstance(self.operation, Operation):
             raise ValueError(f"Invalid operation type: {self.operation}")
+        object.__setattr__(self, '_op_func', _OP_FUNCS[self.operation])
+        object.__setattr__(self, '_opcode', _NUMERIC_OPCODES.get(self.operation, -1))
+        # Interned topics share the cached string hash with message-time
+        # lookups into latest_values and the indexes
+        object.__setattr__(self, 'topic', sys.intern(self.topic))
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Rule:
     name: str
     conditions: List[Condition]
     logical_operator: Operation
     action: str
     action_params: Dict[str, Any]
-    
+    _compiled: Any = field(init=False, repr=False, compare=False, default=None)
+    # Plain bool so hot paths compare an int, not Enum members
+    _is_and: bool = field(init=False, repr=False, compare=False, default=True)
+
     def __post_init__(self):
         if self.logical_operator not in (Operation.AND, Operation.OR):
             raise ValueError(f"Invalid logical operator: {self.logical_operator}")
         if not self.conditions:
             raise ValueError("Rule must have at least one condition")
+        object.__setattr__(self, '_is_and', self.logical_operator == Operation.AND)
+
+    def compile(self):
+        """Compile the rule into one boolean expression over latest_values.
+
+        Emits source like
+            lambda lv: ('t1' in lv and lv['t1'] >= 30.0) and ...
+        so evaluation is a single short-circuiting expression with no dict
+        dispatch or per-condition function calls.
+        """
+        parts = []
+        for condition in self.conditions:
+            # AND/OR on a single condition degrades to equality, matching
+            # the interpreted path
+            op = ('==' if condition.operation in (Operation.AND, Operation.OR)
+                  else condition.operation.value)
+            parts.append(f"({condition.topic!r} in lv and "
+                         f"lv[{condition.topic!r}] {op} {condition.value!r})")
+        joiner = ' and ' if self.logical_operator == Operation.AND else ' or '
+        return eval('lambda lv: ' + joiner.join(parts), {})
 
 class Action(ABC):
     @abstractmethod
@@ -78,29 +215,52 @@ class TodoAction(Action):
 class EmailAction(Action):
     def __init__(self, config: Optional[Dict[str, str]] = None):
         self.config = config or {}
-    
+        # Warm SMTP connection reused across alerts; rebuilt on failure
+        self._smtp: Optional[smtplib.SMTP_SSL] = None
+        self._lock = threading.Lock()
+        self._template: Optional[EmailMessage] = None
+        if self.config:
+            template = EmailMessage()
+            template['From'] = self.config['from_email']
+            self._template = template
+
+    def _get_smtp(self) -> smtplib.SMTP_SSL:
+        """Return a live SMTP connection, reconnecting if the old one died."""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except Exception:
+                pass
+        server = smtplib.SMTP_SSL(self.config['smtp_server'], self.config['smtp_port'])
+        server.login(self.config['username'], self.config['password'])
+        self._smtp = server
+        return server
+
     def execute(self, params: Dict[str, Any]) -> None:
         if not all(key in params for key in ["subject", "body", "to_email"]):
             raise ValueError("Missing required email parameters")
-            
+
         if not self.config:
             logger.info(f"Email would be sent: Subject={params['subject']}, To={params['to_email']}")
             return
-            
-        msg = EmailMessage()
-        msg.set_content(params['body'])
-        msg['Subject'] = params['subject']
-        msg['From'] = self.config['from_email']
-        msg['To'] = params['to_email']
-        
-        try:
-            with smtplib.SMTP_SSL(self.config['smtp_server'], self.config['smtp_port']) as server:
-                server.login(self.config['username'], self.config['password'])
-                server.send_message(msg)
-            logger.info(f"Email sent successfully to {params['to_email']}")
-        except Exception as e:
-            logger.error(f"Failed to send email: {str(e)}")
-            raise
+
+        with self._lock:
+            msg = self._template
+            del msg['Subject']
+            del msg['To']
+            msg.set_content(params['body'])
+            msg['Subject'] = params['subject']
+            msg['To'] = params['to_email']
+
+            try:
+                self._get_smtp().send_message(msg)
+                logger.info(f"Email sent successfully to {params['to_email']}")
+            except Exception as e:
+                # Drop the connection so the next send starts fresh
+                self._smtp = None
+                logger.error(f"Failed to send email: {str(e)}")
+                raise
 
 class PhoneAction(Action):
     def execute(self, params: Dict[str, Any]) -> None:
@@ -109,9 +269,46 @@ class PhoneAction(Action):
         logger.info(f"Phone call would be made to {params['phone_number']} with message: {params['message']}")
 
 class RuleEngine:
-    def __init__(self):
+    def __init__(self, use_broker_filters: bool = False):
+        # With an MQTT+ style broker, numeric threshold conditions can be
+        # filtered broker-side so non-matching readings never hit the wire;
+        # the Python-side check stays as a safety net either way
+        self.use_broker_filters = use_broker_filters
         self.rules: List[Rule] = []
         self.latest_values: Dict[str, Any] = {}
+        # topic -> dotted json_path for object payloads where only one
+        # field feeds the rules
+        self._topic_paths: Dict[str, str] = {}
+        # Topics whose thresholds are numeric publish bare numbers; their
+        # payloads skip the JSON parser entirely
+        self._numeric_topics: set = set()
+        # topic -> (msgspec Decoder, field name) for single-field object
+        # payloads: decodes bytes straight into a typed struct, no dict tree
+        self._decoders: Dict[str, Any] = {}
+        # Per-rule bitmasks (keyed by rule identity) tracking which condition
+        # topics have reported at least once; AND rules skip evaluation until
+        # every topic has been seen
+        self._rule_need: Dict[int, int] = {}
+        self._rule_seen: Dict[int, int] = {}
+        self._rule_topic_bits: Dict[int, Dict[str, int]] = {}
+        # on_message only enqueues; this thread drains the queue in batches
+        # so paho's network thread never runs parse or rule evaluation
+        self._msg_queue: SimpleQueue = SimpleQueue()
+        self._drain_thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._drain_thread.start()
+        # Inverted index so a message only evaluates rules that reference
+        # its topic instead of the whole rule set
+        self._topic_to_rules: Dict[str, List[Rule]] = defaultdict(list)
+        # Slow actions (SMTP handshakes, phone calls) run here so they
+        # never stall the MQTT network thread
+        self._action_executor = ThreadPoolExecutor(max_workers=4)
+        # Structure-of-arrays layout for rules whose conditions are all
+        # numeric compares: one vectorized NumPy pass replaces the Python
+        # loop over those rules. Rebuilt lazily when the rule set changes
+        self._soa_dirty = True
+        self._soa_rules: List[Rule] = []
+        self._soa_rule_ids: set = set()
+        self._soa_topic_ids: Dict[str, int] = {}
         self.actions: Dict[str, Action] = {
             "add_to_todo": TodoAction(),
             "send_email": EmailAction(),
@@ -124,31 +321,62 @@ class RuleEngine:
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
         self.client.on_subscribe = self.on_subscribe  # Added subscribe callback
-        
-        # Operation mapping
-        self.ops = {
-            Operation.GREATER_EQUAL: lambda x, y: x >= y,
-            Operation.GREATER: lambda x, y: x > y,
-            Operation.LESS: lambda x, y: x < y,
-            Operation.LESS_EQUAL: lambda x, y: x <= y,
-            Operation.EQUALS: lambda x, y: x == y,
-            Operation.NOT_EQUALS: lambda x, y: x != y
-        }
     
     def add_rule(self, rule: Rule) -> None:
         if not isinstance(rule, Rule):
             raise TypeError("Expected Rule object")
-        
+
         self.rules.append(rule)
+        self._soa_dirty = True
+        rid = id(rule)
+        bits: Dict[str, int] = {}
+        for i, condition in enumerate(rule.conditions):
+            bits[condition.topic] = bits.get(condition.topic, 0) | (1 << i)
+        self._rule_topic_bits[rid] = bits
+        self._rule_need[rid] = (1 << len(rule.conditions)) - 1
+        seen = 0
+        for topic, bit in bits.items():
+            if topic in self.latest_values:
+                seen |= bit
+        self._rule_seen[rid] = seen
+        for condition in rule.conditions:
+            if condition.json_path:
+                self._topic_paths[condition.topic] = condition.json_path
+                if msgspec is not None and '.' not in condition.json_path:
+                    struct = msgspec.defstruct('SensorMsg', [(condition.json_path, Any)])
+                    self._decoders[condition.topic] = (msgspec.json.Decoder(struct),
+                                                       condition.json_path)
+            elif self._is_numeric(condition.value):
+                self._numeric_topics.add(condition.topic)
+            if rule not in self._topic_to_rules[condition.topic]:
+                self._topic_to_rules[condition.topic].append(rule)
+        try:
+            object.__setattr__(rule, '_compiled', rule.compile())
+        except Exception as e:
+            logger.warning(f"Could not compile rule '{rule.name}', using interpreter: {str(e)}")
         if self.client.is_connected():
             for condition in rule.conditions:
-                logger.debug(f"Subscribing to topic: {condition.topic}")
-                result = self.client.subscribe(condition.topic)
-                logger.debug(f"Subscribe result: {result}")
+                topic = self._subscription_topic(condition)
+                logger.debug("Subscribing to topic: %s", topic)
+                result = self.client.subscribe(topic)
+                logger.debug("Subscribe result: %s", result)
         else:
             logger.warning("MQTT client not connected when adding rule")
     
-    def connect_mqtt(self, broker: str, port: int = 1883, username: Optional[str] = None, 
+    def _subscription_topic(self, condition: Condition) -> str:
+        """Return the topic to subscribe for a condition.
+
+        When broker filters are enabled, numeric threshold conditions become
+        MQTT+ rule subscriptions like '$GTE;30.0/sensor/temp' and the broker
+        drops non-matching readings before they reach us.
+        """
+        if self.use_broker_filters and isinstance(condition.value, (int, float)):
+            prefix = _OP_TO_PREFIX.get(condition.operation.name)
+            if prefix is not None:
+                return f"${prefix};{condition.value}/{condition.topic}"
+        return condition.topic
+
+    def connect_mqtt(self, broker: str, port: int = 1883, username: Optional[str] = None,
                     password: Optional[str] = None, use_tls: bool = False) -> None:
         if use_tls:
             self.client.tls_set()
@@ -169,10 +397,10 @@ class RuleEngine:
         # Resubscribe to all topics in case of reconnection
         for rule in self.rules:
             for condition in rule.conditions:
-                print(condition.topic)
-                logger.debug(f"Resubscribing to topic: {condition.topic}")
-                result = self.client.subscribe(condition.topic)
-                logger.debug(f"Resubscribe result: {result}")
+                topic = self._subscription_topic(condition)
+                logger.debug("Resubscribing to topic: %s", topic)
+                result = self.client.subscribe(topic)
+                logger.debug("Resubscribe result: %s", result)
     
     def on_subscribe(self, client, userdata, mid, reason_codes, properties):
         logger.debug(f"Subscribed with reason codes: {reason_codes}")
@@ -180,67 +408,284 @@ class RuleEngine:
     def on_disconnect(self, client, userdata, reason_code, properties):
         logger.warning(f"Disconnected with result code {reason_code}")
     
+    @staticmethod
+    def _parse_payload(payload: bytes) -> Any:
+        """Parse an MQTT payload into a Python value.
+
+        Bare numbers are the common case for sensor topics, so try the
+        C-level bytes->float conversion before the JSON parser.
+        """
+        if payload[:1] in b"-0123456789":
+            try:
+                return float(payload)
+            except ValueError:
+                pass
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            return payload.decode()
+
+    @staticmethod
+    def _extract_path(value: Any, path: str) -> Any:
+        """Pull a single field out of a parsed payload by dotted path."""
+        for part in path.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
     def on_message(self, client, userdata, msg):
-        logger.debug(f"Received message - Topic: {msg.topic}, Payload: {msg.payload}")
+        # Keep the network thread's work to a single enqueue; everything
+        # else happens on the drain thread
+        self._msg_queue.put((msg.topic, msg.payload))
+
+    def _drain_loop(self) -> None:
+        """Drain queued messages in batches, coalescing evaluation per topic.
+
+        Every message in a drained batch updates latest_values first; each
+        distinct topic is then evaluated once, so a burst of N publishes on
+        one topic costs one evaluation instead of N. The drain itself acts
+        as the coalescing window: while evaluation runs, new messages pile
+        up in the queue and form the next batch.
+        """
+        while True:
+            item = self._msg_queue.get()
+            dirty: Set[str] = set()
+            while item is not None:
+                topic = self._apply_message(*item)
+                if topic is not None:
+                    dirty.add(topic)
+                try:
+                    item = self._msg_queue.get_nowait()
+                except Empty:
+                    break
+            else:
+                self._evaluate_dirty(dirty)
+                return  # None is the shutdown sentinel
+            self._evaluate_dirty(dirty)
+
+    def _apply_message(self, msg_topic: str, payload: bytes) -> Optional[str]:
+        """Parse one message and record its value; returns the topic touched."""
+        logger.debug("Received message - Topic: %s, Payload: %s", msg_topic, payload)
         try:
-            try:
-                value = json.loads(msg.payload)
-            except json.JSONDecodeError:
-                value = msg.payload.decode()
-                # Try to convert to float if it's a numeric string
+            # The same few dozen topics arrive millions of times; interning
+            # reuses the cached hash in every dict lookup below
+            topic = sys.intern(msg_topic)
+            decoder = self._decoders.get(topic)
+            if decoder is not None:
+                # Typed single-field decode: no intermediate dict tree
                 try:
-                    value = float(value)
-                except ValueError:
-                    pass
-            
-            logger.debug(f"Parsed value: {value} (type: {type(value)})")
-            self.latest_values[msg.topic] = value
-            self.evaluate_rules()
+                    value = getattr(decoder[0].decode(payload), decoder[1])
+                except msgspec.DecodeError:
+                    value = self._extract_path(self._parse_payload(payload),
+                                               self._topic_paths[topic])
+            else:
+                if topic in self._numeric_topics:
+                    # Known-numeric topic: bytes->float without touching JSON
+                    try:
+                        value = float(payload)
+                    except ValueError:
+                        value = self._parse_payload(payload)
+                else:
+                    value = self._parse_payload(payload)
+                # Keep only the field the rules care about, not the whole tree
+                path = self._topic_paths.get(topic)
+                if path is not None:
+                    value = self._extract_path(value, path)
+            logger.debug("Parsed value: %r", value)
+            self.latest_values[topic] = value
+            self._note_value(topic, value)
+            return topic
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}", exc_info=True)
+            logger.error(f"Error processing message: {str(e)}",
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
+            return None
     
     def evaluate_condition(self, condition: Condition) -> bool:
         if condition.topic not in self.latest_values:
-            logger.debug(f"Topic {condition.topic} not in latest values")
+            logger.debug("Topic %s not in latest values", condition.topic)
             return False
                     
         value = self.latest_values[condition.topic]
-        logger.debug(f"Evaluating condition - Topic: {condition.topic}, "
-                    f"Operation: {condition.operation}, "
-                    f"Value: {value} (type: {type(value)}), "
-                    f"Target: {condition.value} (type: {type(condition.value)})")
-        
+        logger.debug("Evaluating condition - Topic: %s, Operation: %s, Value: %r, Target: %r",
+                     condition.topic, condition.operation, value, condition.value)
+
         try:
-            if condition.operation in (Operation.AND, Operation.OR):
-                logging.debug("AND/OR operations not supported for individual conditions")
-                result = value == condition.value
-            else:
-                logging.debug(f"Evaluating condition using operation: {condition.operation} ({value} {condition.operation.value} {condition.value})")
-                result = self.ops[condition.operation](value, condition.value)
-            logger.debug(f"Condition evaluation result: {result}")
+            result = condition._op_func(value, condition.value)
+            logger.debug("Condition evaluation result: %s", result)
             return result
         except Exception as e:
-            logger.error(f"Error evaluating condition: {str(e)}", exc_info=True)
+            logger.error(f"Error evaluating condition: {str(e)}",
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
             return False
     
+    def _evaluate_rule(self, rule: Rule) -> None:
+        try:
+            logger.debug("Evaluating rule: %s", rule.name)
+            if rule._compiled is not None:
+                rule_triggered = rule._compiled(self.latest_values)
+            elif rule._is_and:
+                # Generators let all()/any() stop at the first deciding
+                # condition instead of evaluating every one
+                rule_triggered = all(self.evaluate_condition(c) for c in rule.conditions)
+            else:
+                rule_triggered = any(self.evaluate_condition(c) for c in rule.conditions)
+
+            logger.debug("Rule '%s' triggered: %s", rule.name, rule_triggered)
+
+            if rule_triggered:
+                logger.info(f"Executing action for rule '{rule.name}'")
+                self.execute_action(rule.action, rule.action_params)
+        except Exception as e:
+            logger.error(f"Error evaluating rule '{rule.name}': {str(e)}",
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
+
+    def _run_action(self, action: Action, name: str, params: Dict[str, Any]) -> None:
+        try:
+            action.execute(params)
+        except Exception as e:
+            logger.error(f"Error executing action '{name}': {str(e)}",
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
+
+    def execute_action(self, name: str, params: Dict[str, Any]) -> None:
+        """Dispatch a named action to the worker pool."""
+        action = self.actions.get(name)
+        if action is None:
+            logger.error(f"Unknown action: {name}")
+            return
+        self._action_executor.submit(self._run_action, action, name, params)
+
+    @staticmethod
+    def _is_numeric(value: Any) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def _build_soa(self) -> None:
+        """Pack fully-numeric rules into parallel arrays.
+
+        A rule qualifies when every condition is a numeric comparison; its
+        thresholds, opcodes and topic indices land in contiguous arrays so
+        the whole set evaluates as one SIMD pass instead of per-rule Python.
+        """
+        topics: Dict[str, int] = {}
+        thresh: List[float] = []
+        opcodes: List[int] = []
+        topic_idx: List[int] = []
+        starts: List[int] = []
+        is_and: List[bool] = []
+        soa_rules: List[Rule] = []
+
+        for rule in self.rules:
+            if not all(self._is_numeric(c.value) and c._opcode >= 0
+                       for c in rule.conditions):
+                continue
+            starts.append(len(thresh))
+            is_and.append(rule._is_and)
+            soa_rules.append(rule)
+            for c in rule.conditions:
+                thresh.append(float(c.value))
+                opcodes.append(c._opcode)
+                topic_idx.append(topics.setdefault(c.topic, len(topics)))
+
+        self._soa_rules = soa_rules
+        self._soa_rule_ids = {id(rule) for rule in soa_rules}
+        self._soa_topic_ids = topics
+        self._soa_dirty = False
+        if not soa_rules:
+            return
+
+        self._thresh = np.asarray(thresh, dtype=np.float64)
+        self._opcode = np.asarray(opcodes, dtype=np.int8)
+        self._topic_idx = np.asarray(topic_idx, dtype=np.int32)
+        self._rule_starts = np.asarray(starts, dtype=np.int32)
+        self._rule_is_and = np.asarray(is_and, dtype=bool)
+        # Unseen topics are NaN; NaN compares False, so they never trigger
+        self._values = np.full(len(topics), np.nan)
+        for topic, idx in topics.items():
+            value = self.latest_values.get(topic)
+            if self._is_numeric(value):
+                self._values[idx] = value
+
+    def _note_value(self, topic: str, value: Any) -> None:
+        """Mirror a fresh value into the vectorized value array."""
+        if self._soa_dirty:
+            self._build_soa()
+        idx = self._soa_topic_ids.get(topic)
+        if idx is not None and self._is_numeric(value):
+            self._values[idx] = value
+
+    def _evaluate_vectorized(self) -> None:
+        """Evaluate every SoA rule in one NumPy pass and fire the triggered ones."""
+        if self._soa_dirty:
+            self._build_soa()
+        if not self._soa_rules:
+            return
+        if _eval_rules_kernel is not None:
+            # The compiled kernel fuses compare and reduce with per-rule
+            # short-circuiting and no NumPy temporaries
+            triggered = np.zeros(len(self._soa_rules), dtype=bool)
+            _eval_rules_kernel(self._values, self._topic_idx, self._opcode,
+                               self._thresh, self._rule_starts,
+                               self._rule_is_and, triggered)
+        else:
+            vals = self._values[self._topic_idx]
+            results = np.zeros(vals.shape, dtype=bool)
+            for code, ufunc in _OPCODE_UFUNCS:
+                mask = self._opcode == code
+                if mask.any():
+                    results[mask] = ufunc(vals[mask], self._thresh[mask])
+            # not_equal is True against NaN; unseen topics must not satisfy anything
+            results &= ~np.isnan(vals)
+            and_results = np.logical_and.reduceat(results, self._rule_starts)
+            or_results = np.logical_or.reduceat(results, self._rule_starts)
+            triggered = np.where(self._rule_is_and, and_results, or_results)
+        for i in np.nonzero(triggered)[0]:
+            rule = self._soa_rules[i]
+            logger.info(f"Executing action for rule '{rule.name}'")
+            self.execute_action(rule.action, rule.action_params)
+
+    def _evaluate_dirty(self, topics: Set[str]) -> None:
+        """Evaluate each dirty topic's rules once, with one vectorized pass."""
+        for topic in topics:
+            self._evaluate_scalar_for_topic(topic)
+        if not self._soa_topic_ids.keys().isdisjoint(topics):
+            self._evaluate_vectorized()
+
+    def _evaluate_for_topic(self, topic: str) -> None:
+        """Evaluate only the rules whose conditions reference this topic."""
+        self._evaluate_scalar_for_topic(topic)
+        if topic in self._soa_topic_ids:
+            self._evaluate_vectorized()
+
+    def _evaluate_scalar_for_topic(self, topic: str) -> None:
+        """Run the interpreted/compiled rules referencing this topic."""
+        if self._soa_dirty:
+            self._build_soa()
+        for rule in self._topic_to_rules.get(topic, ()):
+            rid = id(rule)
+            seen = self._rule_seen[rid] | self._rule_topic_bits[rid].get(topic, 0)
+            self._rule_seen[rid] = seen
+            if rid in self._soa_rule_ids:
+                continue
+            # AND rules can't trigger until every topic has reported once
+            if rule._is_and and seen != self._rule_need[rid]:
+                continue
+            self._evaluate_rule(rule)
+
     def evaluate_rules(self) -> None:
         logger.debug("Evaluating all rules")
+        if self._soa_dirty:
+            self._build_soa()
         for rule in self.rules:
-            try:
-                logger.debug(f"Evaluating rule: {rule.name}")
-                results = [self.evaluate_condition(c) for c in rule.conditions]
-                logger.debug(f"Rule conditions results: {results}")
-                
-                rule_triggered = (all(results) if rule.logical_operator == Operation.AND 
-                                else any(results))
-                
-                logger.debug(f"Rule '{rule.name}' triggered: {rule_triggered}")
-                
-                if rule_triggered:
-                    logger.info(f"Executing action for rule '{rule.name}'")
-                    self.execute_action(rule.action, rule.action_params)
-            except Exception as e:
-                logger.error(f"Error evaluating rule '{rule.name}': {str(e)}", exc_info=True)
+            if id(rule) not in self._soa_rule_ids:
+                self._evaluate_rule(rule)
+        self._evaluate_vectorized()
+
+    def stop(self) -> None:
+        """Stop the MQTT loop, the drain thread and the action workers."""
+        self.client.loop_stop()
+        self.client.disconnect()
+        self._msg_queue.put(None)
+        self._action_executor.shutdown(wait=False)
 
 if __name__ == "__main__":
     # Example usage
@@ -271,8 +716,8 @@ if __name__ == "__main__":
         # mosquitto_pub -h test.mosquitto.org -t sensor/humidity -m "65.0"
         
         print("Listening for messages. Use Ctrl+C to stop.")
-        while True:
-            pass
+        # Sleep until interrupted; the MQTT loop runs on its own thread
+        threading.Event().wait()
     except KeyboardInterrupt:
         print("\nStopping...")
     finally: